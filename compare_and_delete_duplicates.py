@@ -1,8 +1,22 @@
 import os
 import hashlib
+import mmap
 import csv
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial as bind_args
 from pathlib import Path
 
+try:
+    import blake3  # Optional, much faster than MD5: pip install blake3
+except ImportError:
+    blake3 = None
+
+# Hash algorithm in use (cached hashes are stored per algorithm)
+HASH_NAME = "blake3" if blake3 is not None else "blake2b"
+
 # --- Configurations ---
 # Path 1: Reference directory (Files here are preserved)
 # Example: "D:/Photos/Original_Backup"
@@ -15,24 +29,240 @@ TARGET_DIR = r"F:/사진"
 # Log file name
 LOG_FILE = "deletion_log.csv"
 
+# Number of processes used to hash files in parallel (Windows allows at most 61)
+HASH_WORKERS = min(os.cpu_count() or 1, 61)
+
+# Set to True for spinning hard disks: hashing then uses a few threads per
+# physical disk instead of one process per core, to limit seek contention
+# while keeping every disk busy
+SPINNING_DISK = False
+
+# Only the first PARTIAL_SIZE bytes of same-size files are hashed at first;
+# the full file is hashed only when those first bytes match
+PARTIAL_SIZE = 512 * 1024
+
+# Files larger than this are memory-mapped and hashed in a single call
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# Persistent hash cache: unchanged files (same path, size and mtime) are not re-hashed on later runs
+HASH_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "dedup_hashes.sqlite")
+
+_last_progress = 0.0
+
+def show_progress(message):
+    """Writes a one-line status update to stderr, at most every 0.1 seconds."""
+    global _last_progress
+    now = time.monotonic()
+    if now - _last_progress > 0.1: # Printing every file can dominate a fast scan
+        _last_progress = now
+        sys.stderr.write(f"{message}\r")
+        sys.stderr.flush()
+
+def new_hasher():
+    """Returns a BLAKE3 hasher, or BLAKE2b from the standard library if blake3 is not installed."""
+    if blake3 is not None:
+        # Files are already hashed in parallel, so keep each hasher single-threaded
+        return blake3.blake3(max_threads=1)
+    return hashlib.blake2b(digest_size=16)
+
 def get_file_hash(path):
-    """Reads file content and generates MD5 hash (for content comparison)."""
-    hasher = hashlib.md5()
+    """Reads file content and generates a BLAKE3/BLAKE2b hash (for content comparison)."""
+    hasher = new_hasher()
+    try:
+        if hasattr(hasher, 'update_mmap'):
+            # blake3 (>= 0.4) opens, reads and hashes the whole file in native code
+            hasher.update_mmap(path)
+            return hasher.hexdigest()
+
+        with open(path, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+                # Large files: hash the whole memory-mapped file in one C call
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL) # Linux: prefetch pages aggressively
+                    hasher.update(mm)
+                return hasher.hexdigest()
+
+            # Read in 1MB chunks into one reusable buffer
+            buf = bytearray(1024 * 1024)
+            view = memoryview(buf)
+            if hasattr(os, 'posix_fadvise'):
+                # Linux: widen kernel readahead so the next reads overlap with hashing
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while n := f.readinto(buf):
+                hasher.update(view[:n])
+        return hasher.hexdigest()
+    except Exception as e:
+        print(f"Hash calculation error ({path}): {e}")
+        return None
+
+def get_partial_hash(path, n=None):
+    """Hashes only the first n bytes of a file (PARTIAL_SIZE by default) as a cheap pre-check."""
+    if n is None:
+        n = PARTIAL_SIZE
+    hasher = new_hasher()
     try:
         with open(path, 'rb') as f:
-            # Read in 64KB chunks to handle large files
-            while buf := f.read(65536):
-                hasher.update(buf)
+            hasher.update(f.read(n))
         return hasher.hexdigest()
     except Exception as e:
         print(f"Hash calculation error ({path}): {e}")
         return None
 
+def open_hash_cache():
+    """Opens the persistent hash cache, creating it if needed.
+
+    Returns None if the cache cannot be used (e.g. read-only home directory or a
+    locked database); files are then simply hashed without it.
+    """
+    conn = None
+    try:
+        os.makedirs(os.path.dirname(HASH_CACHE), exist_ok=True)
+        conn = sqlite3.connect(HASH_CACHE)
+        for table in (HASH_NAME, f"{HASH_NAME}_partial_{PARTIAL_SIZE}"):
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                         "(path TEXT PRIMARY KEY, size INTEGER, mtime REAL, hash TEXT)")
+        return conn
+    except (OSError, sqlite3.Error) as e:
+        print(f"[Hash cache disabled] {HASH_CACHE} : {e}")
+        if conn is not None:
+            conn.close()
+        return None
+
+def cached_hash(conn, table, path, size, mtime):
+    """Returns the cached hash of a file if its size and mtime are unchanged, else None."""
+    try:
+        row = conn.execute(f"SELECT size, mtime, hash FROM {table} WHERE path = ?", (path,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row and row[0] == size and row[1] == mtime:
+        return row[2]
+    return None
+
+@lru_cache(maxsize=None)
+def _dir_device(directory):
+    """Returns the device id of a directory (cached, so each folder is stat'ed once)."""
+    try:
+        return os.stat(directory).st_dev
+    except OSError:
+        return None
+
+def map_hashes(hash_func, paths):
+    """Runs hash_func over paths in parallel, yielding results in input order."""
+    if not SPINNING_DISK:
+        with ProcessPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            yield from executor.map(hash_func, paths, chunksize=32)
+        return
+
+    # One small thread pool per physical disk, so reads on one drive never
+    # wait behind another; hashlib releases the GIL, so threads still scale
+    by_device = {}
+    for i, path in enumerate(paths):
+        by_device.setdefault(_dir_device(os.path.dirname(path)), []).append(i)
+    executors = [ThreadPoolExecutor(max_workers=4) for _ in by_device]
+    futures = [None] * len(paths)
+    for executor, indices in zip(executors, by_device.values()):
+        for i in indices:
+            futures[i] = executor.submit(hash_func, paths[i])
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for executor in executors:
+            executor.shutdown(cancel_futures=True)
+
+def hash_files(files, partial=False):
+    """Hashes (path, size, mtime) files in parallel, yielding hashes in input order.
+
+    With partial=True only the first PARTIAL_SIZE bytes are hashed.
+    Files whose size and mtime match the hash cache are not read again.
+    """
+    hash_func, table = get_file_hash, HASH_NAME
+    if partial:
+        # Partial hashes are only comparable for the same prefix length; pass it
+        # explicitly so worker processes hash with exactly this value
+        hash_func = bind_args(get_partial_hash, n=PARTIAL_SIZE)
+        table = f"{HASH_NAME}_partial_{PARTIAL_SIZE}"
+    conn = open_hash_cache()
+    if conn is None:
+        cached = [None] * len(files)
+    else:
+        cached = [cached_hash(conn, table, path, size, mtime) for path, size, mtime in files]
+    misses = [path for (path, _, _), f_hash in zip(files, cached) if f_hash is None]
+
+    computed = map_hashes(hash_func, misses)
+    try:
+        pending = 0
+        for (path, size, mtime), f_hash in zip(files, cached):
+            if f_hash is None:
+                f_hash = next(computed)
+                show_progress(f"   [Hashing] {path}") # Reported as each hash actually arrives
+                if f_hash and conn is not None:
+                    try:
+                        conn.execute(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)",
+                                     (path, size, mtime, f_hash))
+                        pending += 1
+                        if pending >= 1000: # Commit in batches
+                            conn.commit()
+                            pending = 0
+                    except sqlite3.Error as e:
+                        # Keep hashing without the cache
+                        print(f"[Hash cache disabled] {HASH_CACHE} : {e}")
+                        conn.close()
+                        conn = None
+            yield f_hash
+    finally:
+        computed.close()
+        if conn is not None:
+            try:
+                conn.commit()
+            except sqlite3.Error:
+                pass
+            conn.close()
+
+def full_hashes(files, partials):
+    """Yields full hashes for files whose partial hashes are already known, in input order.
+
+    Files no larger than PARTIAL_SIZE were read completely for the partial hash,
+    so it is reused as their full hash.
+    """
+    computed = hash_files([f for f in files if f[1] > PARTIAL_SIZE])
+    try:
+        for f, p_hash in zip(files, partials):
+            yield next(computed) if f[1] > PARTIAL_SIZE else p_hash
+    finally:
+        computed.close()
+
+def _scandir_recursive(path):
+    """Recursively yields DirEntry objects for all files under path.
+
+    Like os.walk, a folder's own files come before the files of its subfolders.
+    """
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+    except OSError as e: # Unreadable, vanished or disconnected folder
+        print(f"[Cannot read folder] {path} : {e}")
+    for subdir in subdirs:
+        yield from _scandir_recursive(subdir)
+
 def find_files(directory):
-    """Finds all files under the specified directory."""
-    for root, _, files in os.walk(directory):
-        for file in files:
-            yield os.path.join(root, file)
+    """Finds all files under the specified directory, yielding (path, size, mtime).
+
+    Paths are absolute, since they are also the keys of the hash cache.
+    """
+    for entry in _scandir_recursive(os.path.abspath(directory)):
+        try:
+            # DirEntry caches the stat result, so no extra syscall here
+            st = entry.stat()
+        except OSError:
+            continue
+        yield entry.path, st.st_size, st.st_mtime
 
 def remove_empty_folders(directory):
     """Recursively removes empty folders."""
@@ -60,18 +290,16 @@ def main():
         print("[Error] Path does not exist. Please check the path settings at the top of the code.")
         return
 
-    # 1. Scan Reference Directory (Path 1) and store hashes
+    # 1. Index Reference Directory (Path 1) by file size
+    # Files of different sizes can never be duplicates, so nothing is hashed yet.
     print(">>> Step 1: Analyzing files in Reference Folder...")
-    reference_hashes = {}
+    ref_by_size = {}
     count = 0
     
-    for path in find_files(REFERENCE_DIR):
-        print(f"   [Scanning] {path}", end='\r')
-        f_hash = get_file_hash(path)
-        if f_hash:
-            # Store hash as key, path as value (only one instance needed for duplicates)
-            reference_hashes[f_hash] = path
-            count += 1
+    for path, size, mtime in find_files(REFERENCE_DIR):
+        show_progress(f"   [Scanning] {path}")
+        ref_by_size.setdefault(size, []).append((path, size, mtime))
+        count += 1
     
     print(f"\n   -> Analysis complete for {count} reference files.\n")
 
@@ -79,45 +307,81 @@ def main():
     print(">>> Step 2: Scanning Target Folder and deleting duplicates...")
     deleted_files = []
     deleted_size = 0
+
+    # Only target files whose size also exists in the reference folder need hashing
+    candidates = []
+    for path, size, mtime in find_files(TARGET_DIR):
+        show_progress(f"   [Scanning] {path}")
+        if size in ref_by_size:
+            candidates.append((path, size, mtime))
+
+    # Hash the first bytes of reference files on demand, only for sizes that have target candidates
+    ref_files = [f for size in {size for _, size, _ in candidates} for f in ref_by_size[size]]
+    ref_by_partial = {}
+    for f, p_hash in zip(ref_files, hash_files(ref_files, partial=True)):
+        if p_hash:
+            ref_by_partial.setdefault((f[1], p_hash), []).append(f)
+
+    # Keep only target files whose first bytes match a reference file of the same size
+    matched, matched_partials = [], []
+    for f, p_hash in zip(candidates, hash_files(candidates, partial=True)):
+        if p_hash and (f[1], p_hash) in ref_by_partial:
+            matched.append(f)
+            matched_partials.append(p_hash)
+
+    # Full hashes only for reference files whose first bytes match a target file
+    ref_files, ref_partials = [], []
+    for size, p_hash in {(f[1], p_hash) for f, p_hash in zip(matched, matched_partials)}:
+        ref_files.extend(ref_by_partial[size, p_hash])
+        ref_partials.extend([p_hash] * len(ref_by_partial[size, p_hash]))
+    reference_hashes = {}
+    for (ref_path, _, _), f_hash in zip(ref_files, full_hashes(ref_files, ref_partials)):
+        if f_hash:
+            # Store hash as key, path as value (only one instance needed for duplicates),
+            # along with the normalized path used for the same-file check
+            reference_hashes[f_hash] = (ref_path, os.path.normcase(os.path.abspath(ref_path)))
     
     # Prepare CSV log file
-    with open(LOG_FILE, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        fieldnames = ['Status', 'Deleted_File_Path', 'Kept_Original_Path', 'Size_Bytes']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for path in find_files(TARGET_DIR):
-            print(f"   [Scanning] {path}", end='\r')
-            f_hash = get_file_hash(path)
-            if not f_hash:
-                continue
-
-            # Check if the same hash exists in the reference directory
-            if f_hash in reference_hashes:
-                original_path = reference_hashes[f_hash]
-                
-                # Skip if the path is exactly the same file (same folder)
-                if os.path.abspath(path) == os.path.abspath(original_path):
+    with open(LOG_FILE, 'w', newline='', encoding='utf-8-sig', buffering=1024*1024) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Status', 'Deleted_File_Path', 'Kept_Original_Path', 'Size_Bytes'])
+        rows = [] # Log records are written in batches
+
+        try:
+            for (path, file_size, _), f_hash in zip(matched, full_hashes(matched, matched_partials)):
+                if not f_hash:
                     continue
 
-                try:
-                    file_size = os.path.getsize(path)
-                    os.remove(path) # Delete file
+                # Check if the same hash exists in the reference directory.
+                # reference_hashes only holds files whose size and first bytes matched
+                # a target, so it stays small and a single lookup is enough.
+                original = reference_hashes.get(f_hash)
+                if original:
+                    original_path, original_abs = original
+                
+                    # Skip if the path is exactly the same file (same folder)
+                    if os.path.normcase(os.path.abspath(path)) == original_abs:
+                        continue
+
+                    try:
+                        os.remove(path) # Delete file
                     
-                    deleted_size += file_size
-                    deleted_files.append(path)
+                        deleted_size += file_size
+                        deleted_files.append(path)
                     
-                    # Log record
-                    writer.writerow({
-                        'Status': 'Deleted',
-                        'Deleted_File_Path': path,
-                        'Kept_Original_Path': original_path,
-                        'Size_Bytes': file_size
-                    })
-                    print(f"[Deleted] {path}" + " " * 50)
+                        # Log record
+                        rows.append(('Deleted', path, original_path, file_size))
+                        if len(rows) >= 1000:
+                            writer.writerows(rows)
+                            rows.clear()
+                        print(f"[Deleted] {path}" + " " * 50)
                     
-                except Exception as e:
-                    print(f"[Delete Failed] {path} : {e}")
+                    except Exception as e:
+                        print(f"[Delete Failed] {path} : {e}")
+
+        finally:
+            # Always log what was already done, even if the run is interrupted
+            writer.writerows(rows)
 
     # 3. Remove empty folders
     remove_empty_folders(TARGET_DIR)
@@ -1,54 +1,296 @@
 import os
 import hashlib
+import mmap
 import csv
+import errno
 import shutil
-from pathlib import Path
-from datetime import datetime
+import sqlite3
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial as bind_args
 from PIL import Image
-from PIL.ExifTags import TAGS
+
+try:
+    import blake3  # Optional, much faster than MD5: pip install blake3
+except ImportError:
+    blake3 = None
+
+HASH_NAME = "blake3" if blake3 is not None else "blake2b" # Cached hashes are stored per algorithm
 
 # --- Configurations ---
 TARGET_DRIVE = "D:/D"             # Source directory to scan
 BACKUP_DIR = "D:/Duplicate_Backup" # Directory where duplicates will be moved
 LOG_FILE = "duplicate_media_report.csv" # Detailed report filename
+HASH_WORKERS = min(os.cpu_count() or 1, 61) # Parallel hashing processes (Windows allows at most 61)
+SPINNING_DISK = False              # True for HDDs: hash with a few threads per disk to limit seeking
+MMAP_THRESHOLD = 4 * 1024 * 1024   # Larger files are memory-mapped and hashed in one call
+PARTIAL_SIZE = 512 * 1024          # Head bytes hashed before deciding to hash the full file
+HASH_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "dedup_hashes.sqlite") # Skips re-hashing unchanged files
+
+# EXIF tag ids: the Exif sub-IFD pointer and DateTimeOriginal inside it
+EXIF_IFD = 0x8769
+DATETIME_ORIGINAL = 0x9003
 
 # Supported file extensions for photos and videos
-EXTENSIONS = {
+EXTENSIONS = frozenset({
     '.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', # Photos
     '.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv'    # Videos
-}
+})
+
+_last_progress = 0.0
+
+def show_progress(message):
+    """Write a one-line status update to stderr, at most every 0.1 seconds."""
+    global _last_progress
+    now = time.monotonic()
+    if now - _last_progress > 0.1: # Printing every file can dominate a fast scan
+        _last_progress = now
+        sys.stderr.write(f"{message}\r")
+        sys.stderr.flush()
+
+def new_hasher():
+    """Return a BLAKE3 hasher, falling back to stdlib BLAKE2b without blake3."""
+    if blake3 is not None:
+        # Files are already hashed in parallel, so keep each hasher single-threaded
+        return blake3.blake3(max_threads=1)
+    return hashlib.blake2b(digest_size=16)
 
 def get_file_hash(path):
-    """Generate MD5 hash to determine file content identity."""
-    hasher = hashlib.md5()
+    """Generate a BLAKE3/BLAKE2b hash to determine file content identity."""
+    hasher = new_hasher()
+    try:
+        if hasattr(hasher, 'update_mmap'):
+            # blake3 (>= 0.4) opens, reads and hashes the whole file in native code
+            hasher.update_mmap(path)
+            return hasher.hexdigest()
+
+        with open(path, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+                # Large files: hash the whole memory-mapped file in one C call
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL) # Linux: prefetch pages aggressively
+                    hasher.update(mm)
+                return hasher.hexdigest()
+
+            buf = bytearray(1024 * 1024) # One reusable 1MB read buffer
+            view = memoryview(buf)
+            if hasattr(os, 'posix_fadvise'):
+                # Linux: widen kernel readahead so the next reads overlap with hashing
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while n := f.readinto(buf):
+                hasher.update(view[:n])
+        return hasher.hexdigest()
+    except Exception:
+        return None
+
+def get_partial_hash(path, n=None):
+    """Hash only the first n bytes (default PARTIAL_SIZE) of a file as a cheap pre-check."""
+    if n is None:
+        n = PARTIAL_SIZE
+    hasher = new_hasher()
     try:
         with open(path, 'rb') as f:
-            while buf := f.read(65536):
-                hasher.update(buf)
+            hasher.update(f.read(n))
         return hasher.hexdigest()
     except Exception:
         return None
 
+def open_hash_cache():
+    """Open the persistent hash cache, creating it if needed.
+
+    Return None if the cache cannot be used (e.g. read-only home directory or a
+    locked database); files are then simply hashed without it.
+    """
+    conn = None
+    try:
+        os.makedirs(os.path.dirname(HASH_CACHE), exist_ok=True)
+        conn = sqlite3.connect(HASH_CACHE)
+        for table in (HASH_NAME, f"{HASH_NAME}_partial_{PARTIAL_SIZE}"):
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                         "(path TEXT PRIMARY KEY, size INTEGER, mtime REAL, hash TEXT)")
+        return conn
+    except (OSError, sqlite3.Error) as e:
+        print(f"\n[Warning] Hash cache disabled: {HASH_CACHE} -> {e}")
+        if conn is not None:
+            conn.close()
+        return None
+
+def cached_hash(conn, table, path, size, mtime):
+    """Return the cached hash of an unchanged file (same size and mtime), else None."""
+    try:
+        row = conn.execute(f"SELECT size, mtime, hash FROM {table} WHERE path = ?", (path,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row and row[0] == size and row[1] == mtime:
+        return row[2]
+    return None
+
+@lru_cache(maxsize=None)
+def _dir_device(directory):
+    """Return the device id of a directory (cached, so each folder is stat'ed once)."""
+    try:
+        return os.stat(directory).st_dev
+    except OSError:
+        return None
+
+def map_hashes(hash_func, paths):
+    """Run hash_func over paths in parallel, yielding results in input order."""
+    if not SPINNING_DISK:
+        with ProcessPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            yield from executor.map(hash_func, paths, chunksize=32)
+        return
+
+    # One small thread pool per physical disk, so reads on one drive never
+    # wait behind another; hashlib releases the GIL, so threads still scale
+    by_device = {}
+    for i, path in enumerate(paths):
+        by_device.setdefault(_dir_device(os.path.dirname(path)), []).append(i)
+    executors = [ThreadPoolExecutor(max_workers=4) for _ in by_device]
+    futures = [None] * len(paths)
+    for executor, indices in zip(executors, by_device.values()):
+        for i in indices:
+            futures[i] = executor.submit(hash_func, paths[i])
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for executor in executors:
+            executor.shutdown(cancel_futures=True)
+
+def hash_files(files, partial=False):
+    """Hash (path, size, mtime) files in parallel, yielding hashes in input order.
+
+    With partial=True only the first PARTIAL_SIZE bytes are hashed.
+    Files whose size and mtime match the hash cache are not read again.
+    """
+    hash_func, table = get_file_hash, HASH_NAME
+    if partial:
+        # Partial hashes are only comparable for the same prefix length; pass it
+        # explicitly so worker processes hash with exactly this value
+        hash_func = bind_args(get_partial_hash, n=PARTIAL_SIZE)
+        table = f"{HASH_NAME}_partial_{PARTIAL_SIZE}"
+    conn = open_hash_cache()
+    if conn is None:
+        cached = [None] * len(files)
+    else:
+        cached = [cached_hash(conn, table, path, size, mtime) for path, size, mtime in files]
+    misses = [path for (path, _, _), f_hash in zip(files, cached) if f_hash is None]
+
+    computed = map_hashes(hash_func, misses)
+    try:
+        pending = 0
+        for (path, size, mtime), f_hash in zip(files, cached):
+            if f_hash is None:
+                f_hash = next(computed)
+                show_progress(f" Hashing: {path[:70]}...") # Reported as each hash actually arrives
+                if f_hash and conn is not None:
+                    try:
+                        conn.execute(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)",
+                                     (path, size, mtime, f_hash))
+                        pending += 1
+                        if pending >= 1000: # Commit in batches
+                            conn.commit()
+                            pending = 0
+                    except sqlite3.Error as e:
+                        # Keep hashing without the cache
+                        print(f"\n[Warning] Hash cache disabled: {HASH_CACHE} -> {e}")
+                        conn.close()
+                        conn = None
+            yield f_hash
+    finally:
+        computed.close()
+        if conn is not None:
+            try:
+                conn.commit()
+            except sqlite3.Error:
+                pass
+            conn.close()
+
+def full_hashes(files, partials):
+    """Yield full hashes for files whose partial hashes are already known, in input order.
+
+    Files no larger than PARTIAL_SIZE were read completely for the partial hash,
+    so it is reused as their full hash.
+    """
+    computed = hash_files([f for f in files if f[1] > PARTIAL_SIZE])
+    try:
+        for f, p_hash in zip(files, partials):
+            yield next(computed) if f[1] > PARTIAL_SIZE else p_hash
+    finally:
+        computed.close()
+
+def _scandir_recursive(path, skip_dir):
+    """Recursively yield DirEntry objects for all files, pruning the skip_dir subtree.
+
+    path must be absolute and skip_dir normalized with os.path.normcase(os.path.abspath(...)).
+    Like os.walk, a folder's own files come before the files of its subfolders,
+    which keeps the "first scanned file wins" tie-break of the sort stable.
+    """
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    # Prevent infinite loop by never descending into the backup directory
+                    if os.path.normcase(entry.path) != skip_dir:
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+    except OSError as e: # Unreadable, vanished or disconnected folder
+        print(f"\n[Error] Cannot read folder: {path} -> {e}")
+    for subdir in subdirs:
+        yield from _scandir_recursive(subdir, skip_dir)
+
+def find_media_files(root, skip_dir):
+    """Yield (path, size, mtime) for every photo/video under root in a single pass.
+
+    Size and mtime come from the stat result cached on each DirEntry,
+    so no file is stat'ed again later.
+    """
+    for entry in _scandir_recursive(root, skip_dir):
+        # Plain string slicing is much cheaper than building a Path per file
+        name = entry.name
+        dot = name.rfind('.')
+        if dot < 0 or name[dot:].lower() not in EXTENSIONS:
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        yield entry.path, st.st_size, st.st_mtime
+
 def get_date_info(path, ext):
     """Extract original capture date (EXIF) or file creation date."""
     if ext in {'.jpg', '.jpeg', '.tiff'}:
         try:
-            image = Image.open(path)
-            info = image._getexif()
-            if info:
-                for tag, value in info.items():
-                    if TAGS.get(tag) == "DateTimeOriginal":
-                        return value
+            # Image.open only parses the header; look up the single tag we need
+            # instead of building the full EXIF dict
+            with Image.open(path) as image:
+                value = image.getexif().get_ifd(EXIF_IFD).get(DATETIME_ORIGINAL)
+            if value:
+                return value
         except Exception:
             pass
     
     # Fallback to creation time for videos or images without EXIF
     try:
         ctime = os.path.getctime(path)
-        return datetime.fromtimestamp(ctime).strftime('%Y:%m:%d %H:%M:%S')
+        return time.strftime('%Y:%m:%d %H:%M:%S', time.localtime(ctime))
     except Exception:
         return "Unknown"
 
+def move_file(src, dest):
+    """Move a file with a single rename, copying only when crossing filesystems."""
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dest) # Different filesystem/drive: copy, then delete
+
 def run_auto_backup():
     files_dict = {}
     all_records = []
@@ -60,69 +302,93 @@ def run_auto_backup():
     print("-" * 70)
 
     # 1. Scanning Files
-    for root, _, files in os.walk(TARGET_DRIVE):
-        # Prevent infinite loop by skipping the backup directory
-        if os.path.abspath(root).startswith(os.path.abspath(BACKUP_DIR)):
-            continue
+    # Scanned files are stored column-wise and referenced by index everywhere below,
+    # which keeps per-file memory small on very large libraries
+    paths = []
+    sizes, mtimes = array('q'), array('d')
 
-        for file in files:
-            ext = Path(file).suffix.lower()
-            if ext in EXTENSIONS:
-                path = os.path.join(root, file)
-                
-                # Real-time status update
-                print(f" Scanning: {path[:70]}...", end='\r')
-                
-                f_hash = get_file_hash(path)
-                if not f_hash: continue
-                
-                mtime = os.path.getmtime(path)
-                info = {
-                    'title': file,
-                    'size': os.path.getsize(path),
-                    'date_taken': get_date_info(path, ext),
-                    'date_mod': datetime.fromtimestamp(mtime).strftime('%Y:%m:%d %H:%M:%S'),
-                    'path': path,
-                    'mtime': mtime,
-                    'status': 'Keep'
-                }
-                files_dict.setdefault(f_hash, []).append(info)
+    # Group by size first: files of different sizes can never be duplicates
+    files_by_size = {}
+    backup_abs = os.path.normcase(os.path.abspath(BACKUP_DIR))
+    for path, size, mtime in find_media_files(os.path.abspath(TARGET_DRIVE), backup_abs):
+        # Real-time status update
+        show_progress(f" Scanning: {path[:70]}...")
+
+        files_by_size.setdefault(size, []).append(len(paths))
+        paths.append(path)
+        sizes.append(size)
+        mtimes.append(mtime)
+
+    # Hash the first bytes of files that share their size with at least one other file
+    to_hash = [i for idx_list in files_by_size.values() if len(idx_list) > 1 for i in idx_list]
+    files_by_partial = {}
+    partials = hash_files([(paths[i], sizes[i], mtimes[i]) for i in to_hash], partial=True)
+    for i, p_hash in zip(to_hash, partials):
+        if p_hash:
+            files_by_partial.setdefault((sizes[i], p_hash), []).append(i)
+
+    # Full hashes only where both size and first bytes match
+    to_hash, partials = [], []
+    for (size, p_hash), idx_list in files_by_partial.items():
+        if len(idx_list) > 1:
+            to_hash.extend(idx_list)
+            partials.extend([p_hash] * len(idx_list))
+    hashes = full_hashes([(paths[i], sizes[i], mtimes[i]) for i in to_hash], partials)
+    for i, f_hash in zip(to_hash, hashes):
+        if not f_hash: continue
+        files_dict.setdefault(f_hash, []).append(i)
 
     print("\n" + "-" * 70)
     print(">>> Scan complete. Processing duplicates and generating logs...")
 
     # 2. Duplicate Detection and Execution
-    with open(LOG_FILE, 'w', newline='', encoding='utf-8-sig') as f:
+    with open(LOG_FILE, 'w', newline='', encoding='utf-8-sig', buffering=1024*1024) as f:
         keys = ['status', 'title', 'size', 'date_taken', 'date_mod', 'path']
-        writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
-
-        for f_hash, info_list in files_dict.items():
-            if len(info_list) > 1:
-                # Sort rules:
-                # 1. Keep files NOT in Google Photos (Move Google Photos first)
-                # 2. Keep longer filenames (Move shorter filenames)
-                # Key returns (is_not_google, name_length). True/High values are kept (index 0).
-                info_list.sort(key=lambda x: (not ('Google Photos' in x['path'] or 'Google 포토' in x['path']), len(x['title'])), reverse=True)
+        writer = csv.writer(f)
+        writer.writerow(keys)
+        rows = [] # CSV rows are written in batches of 1000
+
+        try:
+            for f_hash, idx_list in files_dict.items():
+                if len(idx_list) > 1:
+                    # Sort rules:
+                    # 1. Keep files NOT in Google Photos (Move Google Photos first)
+                    # 2. Keep longer filenames (Move shorter filenames)
+                    # Key returns (is_not_google, name_length). True/High values are kept (index 0).
+                    idx_list.sort(key=lambda i: (not ('Google Photos' in paths[i] or 'Google 포토' in paths[i]), len(os.path.basename(paths[i]))), reverse=True)
                 
-                for i, item in enumerate(info_list):
-                    if i > 0: # Move older duplicates (index 1 and beyond)
-                        item['status'] = 'Move to Backup'
+                    for rank, i in enumerate(idx_list):
+                        path = paths[i]
+                        status = 'Keep'
+                        # EXIF is only needed for the report, so it is read just for logged
+                        # duplicates (and before the file is moved away)
+                        date_taken = get_date_info(path, path[path.rfind('.'):].lower())
+                        date_mod = time.strftime('%Y:%m:%d %H:%M:%S', time.localtime(mtimes[i]))
+                        if rank > 0: # Move older duplicates (index 1 and beyond)
+                            status = 'Move to Backup'
                         
-                        # Calculate relative path to preserve directory structure
-                        rel_path = os.path.relpath(item['path'], TARGET_DRIVE)
-                        dest_path = os.path.join(BACKUP_DIR, rel_path)
+                            # Calculate relative path to preserve directory structure
+                            rel_path = os.path.relpath(path, TARGET_DRIVE)
+                            dest_path = os.path.join(BACKUP_DIR, rel_path)
                         
-                        try:
-                            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                            shutil.move(item['path'], dest_path)
-                            total_moved_size += item['size']
-                            move_queue.append(item)
-                        except Exception as e:
-                            print(f"\n[Error] Failed to move: {item['path']} -> {e}")
+                            try:
+                                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                                move_file(path, dest_path)
+                                total_moved_size += sizes[i]
+                                move_queue.append(i)
+                            except Exception as e:
+                                print(f"\n[Error] Failed to move: {path} -> {e}")
                     
-                    # Record all file info (both Keep and Move) to CSV
-                    writer.writerow({k: item[k] for k in keys})
+                        # Record all file info (both Keep and Move) to CSV
+                        rows.append((status, os.path.basename(path), sizes[i],
+                                     date_taken, date_mod, path))
+                    if len(rows) >= 1000:
+                        writer.writerows(rows)
+                        rows.clear()
+
+        finally:
+            # Always log what was already done, even if the run is interrupted
+            writer.writerows(rows)
 
     # 3. Final Summary
     print("-" * 70)
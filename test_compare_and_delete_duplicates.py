@@ -0,0 +1,144 @@
+import csv
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import compare_and_delete_duplicates as cmp
+
+
+def _configure(monkeypatch, tmp_path, partial_size):
+    monkeypatch.setattr(cmp, "REFERENCE_DIR", str(tmp_path / "ref"))
+    monkeypatch.setattr(cmp, "TARGET_DIR", str(tmp_path / "tgt"))
+    monkeypatch.setattr(cmp, "LOG_FILE", str(tmp_path / "deletion_log.csv"))
+    monkeypatch.setattr(cmp, "HASH_CACHE", str(tmp_path / "cache" / "hashes.sqlite"))
+    monkeypatch.setattr(cmp, "SPINNING_DISK", True)
+    monkeypatch.setattr(cmp, "PARTIAL_SIZE", partial_size)
+
+
+def test_partial_size_change_does_not_reuse_stale_partial_hashes(monkeypatch, tmp_path):
+    # Same size, same first 1000 bytes, different tail, same mtime
+    head = os.urandom(1000)
+    ref, tgt = tmp_path / "ref" / "a.bin", tmp_path / "tgt" / "b.bin"
+    for path, tail in ((ref, b"A" * 1000), (tgt, b"B" * 1000)):
+        path.parent.mkdir()
+        path.write_bytes(head + tail)
+        os.utime(path, (1_600_000_000, 1_600_000_000))
+
+    _configure(monkeypatch, tmp_path, 1000)
+    cmp.main()
+    assert tgt.exists()
+
+    # A larger prefix covers the whole file, so the partial hash becomes the full hash
+    _configure(monkeypatch, tmp_path, 4096)
+    cmp.main()
+    assert tgt.exists()
+    assert ref.exists()
+
+
+def test_duplicate_is_deleted(monkeypatch, tmp_path):
+    data = os.urandom(5000)
+    ref, tgt = tmp_path / "ref" / "a.bin", tmp_path / "tgt" / "sub" / "a_copy.bin"
+    ref.parent.mkdir()
+    ref.write_bytes(data)
+    tgt.parent.mkdir(parents=True)
+    tgt.write_bytes(data)
+
+    _configure(monkeypatch, tmp_path, 1000)
+    cmp.main()
+    assert ref.exists()
+    assert not tgt.exists()
+
+
+def test_unusable_hash_cache_falls_back_to_hashing(monkeypatch, tmp_path):
+    data = os.urandom(5000)
+    ref, tgt = tmp_path / "ref" / "a.bin", tmp_path / "tgt" / "a_copy.bin"
+    for path in (ref, tgt):
+        path.parent.mkdir()
+        path.write_bytes(data)
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+
+    _configure(monkeypatch, tmp_path, 1000)
+    # The cache directory cannot be created because a file is in the way
+    monkeypatch.setattr(cmp, "HASH_CACHE", str(blocker / "hashes.sqlite"))
+    cmp.main()
+    assert ref.exists()
+    assert not tgt.exists()
+
+
+def test_log_keeps_deletions_when_interrupted(monkeypatch, tmp_path):
+    for i in range(5):
+        data = os.urandom(2000 + i)
+        for path in (tmp_path / "ref" / f"{i}.bin", tmp_path / "tgt" / f"{i}_copy.bin"):
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(data)
+
+    real_remove, calls = os.remove, []
+
+    def remove_then_interrupt(path):
+        calls.append(path)
+        if len(calls) == 4:
+            raise Interrupted
+        real_remove(path)
+
+    class Interrupted(BaseException):
+        pass
+
+    _configure(monkeypatch, tmp_path, 1000)
+    monkeypatch.setattr(os, "remove", remove_then_interrupt)
+    with pytest.raises(Interrupted):
+        cmp.main()
+
+    with open(tmp_path / "deletion_log.csv", encoding="utf-8-sig", newline="") as f:
+        logged = [row[1] for row in csv.reader(f)][1:]
+    assert logged == calls[:3]
+    assert not any(os.path.exists(path) for path in logged)
+
+
+def test_relative_roots_do_not_share_cache_entries(monkeypatch, tmp_path):
+    # Same names, sizes and mtimes in two working directories; only run_a has a duplicate
+    first, second, third = (os.urandom(2000) for _ in range(3))
+    layout = {"run_a": (first, first), "run_b": (second, third)}
+    for run, (ref_data, tgt_data) in layout.items():
+        for rel, data in (("ref/a.bin", ref_data), ("tgt/b.bin", tgt_data)):
+            path = tmp_path / run / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            os.utime(path, (1_600_000_000, 1_600_000_000))
+
+    _configure(monkeypatch, tmp_path, 1000)
+    monkeypatch.setattr(cmp, "REFERENCE_DIR", "ref")
+    monkeypatch.setattr(cmp, "TARGET_DIR", "tgt")
+    monkeypatch.chdir(tmp_path / "run_a")
+    cmp.main()
+    assert not (tmp_path / "run_a" / "tgt" / "b.bin").exists()
+
+    monkeypatch.chdir(tmp_path / "run_b")
+    cmp.main()
+    assert (tmp_path / "run_b" / "tgt" / "b.bin").exists()
+
+
+def test_process_pool_path_with_spawned_workers(monkeypatch, tmp_path):
+    # Default SPINNING_DISK = False hashes in a ProcessPoolExecutor. Spawned workers
+    # re-import the module, so they never see monkeypatched globals such as PARTIAL_SIZE.
+    head = os.urandom(524288)  # The module's default PARTIAL_SIZE
+    ref, tgt = tmp_path / "ref" / "a.bin", tmp_path / "tgt" / "b.bin"
+    dup = tmp_path / "tgt" / "a_copy.bin"
+    for path, tail in ((ref, b"A"), (tgt, b"B"), (dup, b"A")):
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(head + tail * 1000)
+
+    spawn = multiprocessing.get_context("spawn")
+    monkeypatch.setattr(cmp, "ProcessPoolExecutor", functools.partial(ProcessPoolExecutor, mp_context=spawn))
+    # Files fit in the prefix, so their partial hash doubles as the full hash
+    _configure(monkeypatch, tmp_path, 1024 * 1024)
+    monkeypatch.setattr(cmp, "SPINNING_DISK", False)
+    monkeypatch.setattr(cmp, "HASH_WORKERS", 2)
+    cmp.main()
+
+    assert ref.exists()
+    assert tgt.exists()
+    assert not dup.exists()
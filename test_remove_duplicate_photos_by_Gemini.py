@@ -0,0 +1,172 @@
+import csv
+import errno
+import os
+import re
+import shutil
+import sys
+import time
+import types
+
+import pytest
+
+try:
+    import PIL.Image  # noqa: F401
+except ImportError:
+    # Stub Pillow so the script imports; get_date_info then falls back to ctime
+    def _no_pillow(path):
+        raise OSError("Pillow is not installed")
+
+    pil = types.ModuleType("PIL")
+    pil.Image = types.ModuleType("PIL.Image")
+    pil.Image.open = _no_pillow
+    sys.modules["PIL"] = pil
+    sys.modules["PIL.Image"] = pil.Image
+
+import remove_duplicate_photos_by_Gemini as gemini
+
+
+class _SortedScandir:
+    """os.scandir replacement that lists entries alphabetically, as NTFS does."""
+
+    real_scandir = os.scandir
+
+    def __init__(self, path):
+        with self.real_scandir(path) as it:
+            self.entries = sorted(it, key=lambda entry: entry.name)
+
+    def __enter__(self):
+        return iter(self.entries)
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _configure(monkeypatch, tmp_path):
+    drive, backup = tmp_path / "D", tmp_path / "D" / "Duplicate_Backup"
+    monkeypatch.setattr(gemini, "TARGET_DRIVE", str(drive))
+    monkeypatch.setattr(gemini, "BACKUP_DIR", str(backup))
+    monkeypatch.setattr(gemini, "LOG_FILE", str(tmp_path / "report.csv"))
+    monkeypatch.setattr(gemini, "HASH_CACHE", str(tmp_path / "cache" / "hashes.sqlite"))
+    return drive, backup
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def test_tie_keeps_the_file_scanned_first(monkeypatch, tmp_path):
+    drive, backup = _configure(monkeypatch, tmp_path)
+    data = os.urandom(3000)
+    _write(drive / "IMG_0001.jpg", data)
+    _write(drive / "Backup2019" / "IMG_0001.jpg", data)
+    monkeypatch.setattr(os, "scandir", _SortedScandir)
+
+    gemini.run_auto_backup()
+
+    # Same Google-ness and name length: the top-level file (listed first) is kept
+    assert (drive / "IMG_0001.jpg").exists()
+    assert not (drive / "Backup2019" / "IMG_0001.jpg").exists()
+    assert (backup / "Backup2019" / "IMG_0001.jpg").read_bytes() == data
+
+
+def _read_report(tmp_path):
+    with open(tmp_path / "report.csv", encoding="utf-8-sig", newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_moves_duplicates_and_writes_report(monkeypatch, tmp_path):
+    drive, backup = _configure(monkeypatch, tmp_path)
+    data = os.urandom(3000)
+    google = drive / "p" / "Google Photos" / "img.jpg"
+    kept = drive / "q" / "longer_name.jpg"
+    _write(google, data)
+    _write(kept, data)
+    _write(drive / "q" / "unique.jpg", os.urandom(3000))
+    _write(drive / "q" / "other_size.mp4", os.urandom(1234))
+    _write(drive / "q" / "notes.txt", data)  # Not a media file, never considered
+    for path in (google, kept):
+        os.utime(path, (1_600_000_000, 1_600_000_000))
+
+    dated = []
+    real_get_date_info = gemini.get_date_info
+
+    def spy_get_date_info(path, ext):
+        dated.append(path)
+        return real_get_date_info(path, ext)
+
+    monkeypatch.setattr(gemini, "get_date_info", spy_get_date_info)
+    gemini.run_auto_backup()
+
+    # Google Photos copies are moved first; the backup mirrors the relative path
+    assert kept.exists()
+    assert not google.exists()
+    assert (backup / "p" / "Google Photos" / "img.jpg").read_bytes() == data
+    assert (drive / "q" / "unique.jpg").exists()
+    assert (drive / "q" / "notes.txt").exists()
+
+    # EXIF/ctime dates are only read for files that end up in the report
+    assert sorted(dated) == sorted([str(google), str(kept)])
+
+    date_mod = time.strftime('%Y:%m:%d %H:%M:%S', time.localtime(1_600_000_000))
+    header, *rows = _read_report(tmp_path)
+    assert header == ['status', 'title', 'size', 'date_taken', 'date_mod', 'path']
+    assert [row[:3] + row[4:] for row in rows] == [
+        ['Keep', 'longer_name.jpg', '3000', date_mod, str(kept)],
+        ['Move to Backup', 'img.jpg', '3000', date_mod, str(google)],
+    ]
+    assert all(re.fullmatch(r"\d{4}:\d\d:\d\d \d\d:\d\d:\d\d", row[3]) for row in rows)
+
+
+def test_backup_dir_is_skipped(monkeypatch, tmp_path):
+    drive, backup = _configure(monkeypatch, tmp_path)
+    data = os.urandom(3000)
+    _write(drive / "photo.jpg", data)
+    _write(backup / "photo_from_last_run.jpg", data)
+    # Only the exact backup folder is pruned, not folders sharing its prefix
+    sibling = drive / "Duplicate_Backup2" / "pic.jpg"  # Shorter name, so this copy is moved
+    _write(sibling, data)
+
+    gemini.run_auto_backup()
+
+    assert (backup / "photo_from_last_run.jpg").exists()
+    assert (drive / "photo.jpg").exists()
+    assert not sibling.exists()
+    assert (backup / "Duplicate_Backup2" / "pic.jpg").exists()
+    assert [row[-1] for row in _read_report(tmp_path)[1:]] == [str(drive / "photo.jpg"), str(sibling)]
+
+
+def test_cross_device_move_falls_back_to_shutil_move(monkeypatch, tmp_path):
+    drive, backup = _configure(monkeypatch, tmp_path)
+    data = os.urandom(3000)
+    _write(drive / "a" / "longer_name.jpg", data)
+    _write(drive / "b" / "short.jpg", data)
+
+    def cross_device_replace(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    fallbacks = []
+    real_move = shutil.move
+
+    def spy_move(src, dst):
+        fallbacks.append((src, dst))
+        return real_move(src, dst)
+
+    monkeypatch.setattr(os, "replace", cross_device_replace)
+    monkeypatch.setattr(shutil, "move", spy_move)
+    gemini.run_auto_backup()
+
+    dest = backup / "b" / "short.jpg"
+    assert fallbacks == [(str(drive / "b" / "short.jpg"), str(dest))]
+    assert dest.read_bytes() == data
+    assert not (drive / "b" / "short.jpg").exists()
+
+
+def test_move_file_reraises_other_errors(monkeypatch, tmp_path):
+    def no_permission(src, dst):
+        raise PermissionError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(os, "replace", no_permission)
+    monkeypatch.setattr(shutil, "move", lambda src, dst: pytest.fail("unexpected fallback"))
+    with pytest.raises(PermissionError):
+        gemini.move_file(str(tmp_path / "src.jpg"), str(tmp_path / "dst.jpg"))